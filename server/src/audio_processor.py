@@ -1,21 +1,61 @@
 from pathlib import Path
+import functools
+import hashlib
+import mmap
+import os
+import queue
+import struct
+import threading
+import wave
+from concurrent.futures import Future
+import numpy as np
+import torch
 import whisper
-from pydub import AudioSegment, silence
-from langdetect import detect
+from pydub import AudioSegment
 import re
 import json
 import jiwer
 from num2words import num2words
+from diskcache import Cache
 
-# Initialize Whisper model globally
-model = whisper.load_model("large-v3-turbo")
+# Initialize Whisper model globally, on the GPU when one is available.
+# QB_WHISPER_DEVICE overrides the choice (e.g. "cpu" or "cuda:1").
+device = os.environ.get("QB_WHISPER_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+use_fp16 = device.startswith("cuda")
+model = whisper.load_model("large-v3-turbo", device=device)
+
+# Whisper installs kv-cache hooks on the model while decoding, so concurrent
+# transcribe calls from different threads must not overlap
+_model_lock = threading.Lock()
+
+# Persistent Whisper results, keyed by (sha1 of the audio file, language)
+_whisper_cache = Cache("./cache/whisper_ar")
+_whisper_cache_en = Cache("./cache/whisper_en")
+
+def _file_sha1(path):
+    """Hash a file's contents for use as a cache key"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# jiwer transform for input that preprocess_text has already normalized and we split into words
+_PRETOKENIZED = jiwer.Compose([])
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_NUMBER_SEPARATORS = str.maketrans({'.': ' ', ':': ' '})
+
+@functools.lru_cache(maxsize=4096)
+def _n2w(n):
+    return num2words(n)
 
 def preprocess_text(text):
     """Preprocess text for comparison, including number-to-word conversion"""
     text = text.lower()
     
     # Remove common punctuation that might appear between numbers and words
-    text = text.replace(".", " ").replace(":", " ")
+    text = text.translate(_NUMBER_SEPARATORS)
     
     # Convert numbers to words (e.g., "1" -> "one")
     words = text.split()
@@ -23,14 +63,14 @@ def preprocess_text(text):
     for word in words:
         if word.isdigit():
             try:
-                word = num2words(int(word))
+                word = _n2w(int(word))
             except:
                 pass
         processed_words.append(word)
     text = ' '.join(processed_words)
     
     # Remove remaining punctuation and extra whitespace
-    text = re.sub(r'[^\w\s]', '', text)
+    text = _PUNCT_RE.sub('', text)
     text = ' '.join(text.split())
     return text
 
@@ -38,55 +78,288 @@ def preprocess_text(text):
 with open('./qb.json', 'r', encoding='utf-8') as f:
     qb_data1 = json.load(f)
 
-def get_source_translation(filename):
+# The same data run through preprocess_text, so references are only cleaned once
+qb_clean = {
+    surah: {key: preprocess_text(text) for key, text in entries.items()}
+    for surah, entries in qb_data1.items()
+}
+
+def _lookup_translation(data, filename):
+    """Look up a filename in qb.json-shaped data. Returns None if there is no entry"""
+    # Handle different filename formats
+    if filename.isdecimal():
+        # Single number format (e.g. "114")
+        surah = data.get(str(int(filename)))  # Remove leading zeros
+        return surah.get('title') if surah else None
+    surah, sep, ayah = filename.partition('_')
+    if sep and surah.isdecimal() and ayah.isdecimal():
+        # Surah_ayah format (e.g. "114_1")
+        return data.get(str(int(surah)), {}).get(str(int(ayah)))
+    return None
+
+@functools.lru_cache(maxsize=8192)
+def get_source_translation(filename: str) -> str:
     """Get the reference translation from qb.json"""
-    try:
-        # Handle different filename formats
-        if "_" not in filename:
-            # Single number format (e.g. "114")
-            return qb_data1[str(int(filename))]['title']
-        else:
-            # Surah_ayah format (e.g. "114_1") 
-            surah, ayah = filename.split('_')
-            surah = str(int(surah))  # Remove leading zeros
-            ayah = str(int(ayah))    # Remove leading zeros
-            return qb_data1[surah][ayah]
-    except Exception as e:
-        print(f"Error getting source translation for {filename}: {e}")
+    translation = _lookup_translation(qb_data1, filename)
+    if translation is None:
+        print(f"No source translation found for {filename}")
         return ""
+    return translation
 
-def matches_translation(english_text: str, source_translation: str) -> bool:
-    """Check if the transcribed text matches the reference translation"""
-    english_clean = preprocess_text(english_text)
-    reference_clean = preprocess_text(source_translation)
-    return english_clean == reference_clean
-
-def get_arabic_end_time(audio_path):
-    result = model.transcribe(
-        audio_path,
-        language="ar",
-        task="transcribe",
-        fp16=False,
-        initial_prompt="Contains arabic followed by english translation. For example: أن ناس The people"
-    )
+def get_source_translation_clean(filename):
+    """Get the reference translation from qb.json, already run through preprocess_text"""
+    translation = _lookup_translation(qb_clean, filename)
+    return translation if translation is not None else ""
+
+def _is_arabic(text):
+    """Check whether text contains any Arabic letters (Arabic and Arabic Supplement blocks)"""
+    return any('\u0600' <= ch <= '\u06FF' or '\u0750' <= ch <= '\u077F' for ch in text)
+
+def get_arabic_end_time(audio_path, waveform=None):
+    """
+    Find where the Arabic recitation ends, in seconds.
+    Pass the already-decoded waveform to avoid decoding the file again.
+    """
+    key = (_file_sha1(audio_path), "ar")
+    segments = _whisper_cache.get(key)
+    if segments is None:
+        with _model_lock:
+            result = model.transcribe(
+                waveform if waveform is not None else audio_path,
+                language="ar",
+                task="transcribe",
+                fp16=use_fp16,
+                initial_prompt="Contains arabic followed by english translation. For example: أن ناس The people"
+            )
+        segments = result["segments"]
+        _whisper_cache[key] = segments
     
-    arabic_segments = []
-    for seg in result["segments"]:
-        try:
-            if detect(seg["text"].strip()) == 'ar':
-                arabic_segments.append(seg)
-        except:
-            continue
+    arabic_segments = [seg for seg in segments if _is_arabic(seg["text"])]
     
     return arabic_segments[-1]["end"] if arabic_segments else 5.0
 
+# transcribe()'s defaults for deciding a decode needs a retry at a higher temperature
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Most English clips decoded in one batched pass
+ENGLISH_MAX_BATCH = 8
+
+def _decode_english_batch(waveforms):
+    """
+    Transcribe clips of at most 30 s in a single batched greedy Whisper pass.
+    Clips whose decode fails transcribe()'s quality checks (repetitive or
+    low-confidence output) are redone with model.transcribe, so they get the
+    same temperature fallback as before. The caller must hold _model_lock.
+    """
+    mel = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(w), model.dims.n_mels, device=model.device)
+        for w in waveforms
+    ])
+    options = whisper.DecodingOptions(language="en", fp16=use_fp16)
+    results = model.decode(mel, options)
+
+    texts = []
+    for waveform, result in zip(waveforms, results):
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            # transcribe() skips windows like this as silence
+            texts.append("")
+        elif (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                or result.avg_logprob < LOGPROB_THRESHOLD):
+            texts.append(model.transcribe(waveform, language="en", fp16=use_fp16)["text"])
+        else:
+            texts.append(result.text)
+    return texts
+
+class _EnglishBatcher:
+    """
+    Collects English transcriptions requested from concurrent split jobs and runs
+    them through Whisper together. There is no timer: a request is decoded as soon
+    as the model is free, along with every other request (up to max_batch) that
+    queued up while the model was busy with another job.
+    """
+    def __init__(self, max_batch: int = ENGLISH_MAX_BATCH):
+        self.max_batch = max_batch
+        self._pending = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, waveform) -> str:
+        """Transcribe one clip, blocking until its batch has been decoded"""
+        future = Future()
+        self._pending.put((waveform, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            with _model_lock:
+                # Everything that arrived while we waited for the model joins this batch
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+
+                try:
+                    texts = _decode_english_batch([waveform for waveform, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+                    continue
+
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+_english_batcher = _EnglishBatcher()
+
+def transcribe_english(waveform, start_ms):
+    """
+    Transcribe the English part of a split, i.e. the decoded waveform from start_ms on.
+    Cached results are reused for identical audio.
+    """
+    english_waveform = waveform[int(start_ms * whisper.audio.SAMPLE_RATE / 1000):]
+    key = (hashlib.sha1(english_waveform.tobytes()).hexdigest(), "en")
+    english_text = _whisper_cache_en.get(key)
+    if english_text is None:
+        if len(english_waveform) <= whisper.audio.N_SAMPLES:
+            # Fits in one Whisper window, so it can share a batch with other jobs
+            english_text = _english_batcher.submit(english_waveform)
+        else:
+            with _model_lock:
+                result = model.transcribe(
+                    english_waveform,
+                    language="en",
+                    fp16=use_fp16
+                )
+            english_text = result["text"]
+        _whisper_cache_en[key] = english_text
+    return english_text
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def _open_wav(audio_path):
+    """
+    Memory-map a 16/32-bit PCM WAV file so its samples can be read and sliced without copying.
+    Returns (channels, sample_width, frame_rate, frames) or None if the file is anything else.
+    """
+    with open(audio_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+    if mm[:4] != b'RIFF' or mm[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(mm):
+        chunk_id = mm[pos:pos + 4]
+        chunk_size, = struct.unpack_from('<I', mm, pos + 4)
+        body = pos + 8
+        if chunk_id == b'fmt ' and chunk_size >= 16:
+            format_tag, channels, frame_rate, _, _, bits = struct.unpack_from('<HHIIHH', mm, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                format_tag, = struct.unpack_from('<H', mm, body + 24)
+            fmt = (format_tag, channels, frame_rate, bits)
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            format_tag, channels, frame_rate, bits = fmt
+            if format_tag != WAVE_FORMAT_PCM or bits not in (16, 32) or channels < 1:
+                return None
+            sample_width = bits // 8
+            frame_width = channels * sample_width
+            size = min(chunk_size, len(mm) - body)
+            size -= size % frame_width
+            return channels, sample_width, frame_rate, memoryview(mm)[body:body + size]
+        pos = body + chunk_size + (chunk_size & 1)
+    return None
+
+def _write_wav(path, channels, sample_width, frame_rate, frames):
+    """Write raw PCM frames to a WAV file as-is"""
+    with wave.open(str(path), 'wb') as out:
+        out.setnchannels(channels)
+        out.setsampwidth(sample_width)
+        out.setframerate(frame_rate)
+        out.writeframes(frames)
+
+def _write_segment_frames(audio: AudioSegment, path, frames):
+    """
+    Write a byte range of a pydub segment's raw PCM (split at a frame boundary) to a WAV file.
+    16/32-bit PCM is already in WAV layout and is written directly; anything else
+    (e.g. 8-bit, which pydub keeps signed) goes through pydub's exporter.
+    """
+    if audio.sample_width in (2, 4):
+        _write_wav(path, audio.channels, audio.sample_width, audio.frame_rate, frames)
+    else:
+        audio._spawn(frames).export(str(path), format="wav")
+
+def _detect_silence_np(frames, channels, sample_width, frame_rate, min_silence_len, silence_thresh):
+    """
+    Vectorized equivalent of pydub's silence.detect_silence (seek_step=1) on raw PCM frames.
+    Returns a list of [start_ms, end_ms] silent ranges.
+    """
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+    samples = np.frombuffer(frames, dtype=dtype)
+    frame_count = len(samples) // channels
+    seg_len = round(1000 * frame_count / frame_rate)
+    if seg_len < min_silence_len:
+        return []
+
+    # Per-frame mean square across channels (same as audioop.rms on interleaved samples)
+    sq = (samples.astype(np.float64) ** 2).reshape(-1, channels).mean(axis=1)
+    csum = np.concatenate(([0.0], np.cumsum(sq)))
+
+    # One window of min_silence_len ms starting at every millisecond
+    starts_ms = np.arange(seg_len - min_silence_len + 1)
+    lo = np.minimum(starts_ms * frame_rate // 1000, len(sq))
+    hi = np.minimum((starts_ms + min_silence_len) * frame_rate // 1000, len(sq))
+    width = np.maximum(hi - lo, 1)
+    mean_sq = (csum[hi] - csum[lo]) / width
+
+    max_possible_amplitude = 2 ** (8 * sample_width - 1)
+    threshold = 10 ** (silence_thresh / 10) * max_possible_amplitude ** 2
+    silent_starts = np.flatnonzero(mean_sq <= threshold)
+    if len(silent_starts) == 0:
+        return []
+
+    # Merge windows that touch or overlap into continuous ranges
+    breaks = np.flatnonzero(np.diff(silent_starts) > min_silence_len)
+    range_starts = silent_starts[np.concatenate(([0], breaks + 1))]
+    range_ends = silent_starts[np.concatenate((breaks, [-1]))] + min_silence_len
+    return [[int(start), int(end)] for start, end in zip(range_starts, range_ends)]
+
+def _best_split_point(silences, target_ms):
+    """
+    Pick the silence starting closest to target_ms and return a point 5/6 of the way
+    through it, in ms
+    """
+    if len(silences) == 0:
+        raise ValueError("No suitable split point found")
+    silences_arr = np.asarray(silences, dtype=np.int64)
+    idx = int(np.argmin(np.abs(silences_arr[:, 0] - target_ms)))
+    start_ms, end_ms = silences_arr[idx]
+    return float(start_ms + (end_ms - start_ms) * (5/6))
+
 def split_audio(audio_path, output_dir_arabic, output_dir_english):
     """Generic function to split an audio file into Arabic and English parts"""
+    # Decode once at Whisper's sample rate; both transcription passes share it
+    waveform = whisper.load_audio(audio_path)
+
     # Get target split time from Whisper
-    target_split_time = get_arabic_end_time(audio_path)
+    target_split_time = get_arabic_end_time(audio_path, waveform)
     
-    # Load the audio
-    audio = AudioSegment.from_file(audio_path)
+    # Load the audio; PCM WAV is memory-mapped, anything else is decoded by pydub
+    wav = _open_wav(audio_path)
+    if wav is not None:
+        channels, sample_width, frame_rate, frames = wav
+    else:
+        audio = AudioSegment.from_file(audio_path)
+        channels, sample_width, frame_rate, frames = (
+            audio.channels, audio.sample_width, audio.frame_rate, audio.raw_data
+        )
     filename = Path(audio_path).stem
     
     # Get source translation
@@ -97,50 +370,44 @@ def split_audio(audio_path, output_dir_arabic, output_dir_english):
     # Detect silences
     silence_threshold = -50
     min_silence_len = 50
-    silences = silence.detect_silence(
-        audio,
+    silences = _detect_silence_np(
+        frames,
+        channels,
+        sample_width,
+        frame_rate,
         min_silence_len=min_silence_len,
         silence_thresh=silence_threshold
     )
 
     # Find best split point
     target_ms = target_split_time * 1000
-    best_gap_start = None
-    smallest_time_diff = float('inf')
-
-    for start_ms, end_ms in silences:
-        time_diff = abs(start_ms - target_ms)
-        if time_diff < smallest_time_diff:
-            smallest_time_diff = time_diff
-            best_gap_start = start_ms + (end_ms - start_ms) * (5/6)
-
-    if best_gap_start is None:
-        raise ValueError("No suitable split point found")
+    best_gap_start = _best_split_point(silences, target_ms)
 
     # Split and save
-    first_part = audio[:best_gap_start]
-    second_part = audio[best_gap_start:]
-    
     arabic_path = output_dir_arabic / f"{filename}.wav"
     english_path = output_dir_english / f"{filename}.wav"
     
-    first_part.export(str(arabic_path), format="wav")
-    second_part.export(str(english_path), format="wav")
+    split_byte = int(best_gap_start * frame_rate / 1000) * channels * sample_width
+    if wav is not None:
+        _write_wav(arabic_path, channels, sample_width, frame_rate, frames[:split_byte])
+        _write_wav(english_path, channels, sample_width, frame_rate, frames[split_byte:])
+    else:
+        _write_segment_frames(audio, arabic_path, frames[:split_byte])
+        _write_segment_frames(audio, english_path, frames[split_byte:])
     
     # Transcribe English part
-    result = model.transcribe(
-        str(english_path),
-        language="en",
-        fp16=False
-    )
-    
-    english_text = result["text"]
+    english_text = transcribe_english(waveform, best_gap_start)
     
     # Calculate WER and check if translations match
-    clean_reference = preprocess_text(source_translation)
-    clean_hypothesis = preprocess_text(english_text)
-    wer = jiwer.wer(clean_reference, clean_hypothesis)
-    matches = matches_translation(english_text, source_translation)
+    ref_tokens = get_source_translation_clean(filename).split()
+    hyp_tokens = preprocess_text(english_text).split()
+    wer = jiwer.wer(
+        [ref_tokens],
+        [hyp_tokens],
+        reference_transform=_PRETOKENIZED,
+        hypothesis_transform=_PRETOKENIZED
+    )
+    matches = ref_tokens == hyp_tokens
     
     return {
         "english_transcription": english_text,
@@ -156,7 +423,6 @@ def split_audio_custom(audio_path, output_dir_arabic, output_dir_english, custom
     Then transcribe the English part, compute WER, compare with source translation, etc.
     """
     print(f"Splitting audio at {custom_split_time_ms}ms")
-    audio = AudioSegment.from_file(audio_path)
     filename = Path(audio_path).stem
 
     # Get source translation
@@ -164,29 +430,37 @@ def split_audio_custom(audio_path, output_dir_arabic, output_dir_english, custom
     if source_translation is None:
         raise ValueError(f"Could not find source translation for {filename}")
 
-    # Split at custom_split_time_ms
-    first_part = audio[:custom_split_time_ms]
-    second_part = audio[custom_split_time_ms:]
-
-    # Export resulting files
+    # Split at custom_split_time_ms and export resulting files
     arabic_path = output_dir_arabic / f"{filename}.wav"
     english_path = output_dir_english / f"{filename}.wav"
-    first_part.export(str(arabic_path), format="wav")
-    second_part.export(str(english_path), format="wav")
+    wav = _open_wav(audio_path)
+    if wav is not None:
+        # PCM WAV: write the two byte ranges of the memory-mapped file as they are
+        channels, sample_width, frame_rate, frames = wav
+        split_byte = int(custom_split_time_ms * frame_rate / 1000) * channels * sample_width
+        _write_wav(arabic_path, channels, sample_width, frame_rate, frames[:split_byte])
+        _write_wav(english_path, channels, sample_width, frame_rate, frames[split_byte:])
+    else:
+        audio = AudioSegment.from_file(audio_path)
+        split_byte = int(custom_split_time_ms * audio.frame_rate / 1000) * audio.frame_width
+        raw = audio.raw_data
+        _write_segment_frames(audio, arabic_path, raw[:split_byte])
+        _write_segment_frames(audio, english_path, raw[split_byte:])
 
     # Transcribe English part
-    result = model.transcribe(
-        str(english_path),
-        language="en",
-        fp16=False
-    )
-    english_text = result["text"]
+    waveform = whisper.load_audio(audio_path)
+    english_text = transcribe_english(waveform, custom_split_time_ms)
 
     # Calculate WER and check if translations match
-    clean_reference = preprocess_text(source_translation)
-    clean_hypothesis = preprocess_text(english_text)
-    wer = jiwer.wer(clean_reference, clean_hypothesis)
-    matches = matches_translation(english_text, source_translation)
+    ref_tokens = get_source_translation_clean(filename).split()
+    hyp_tokens = preprocess_text(english_text).split()
+    wer = jiwer.wer(
+        [ref_tokens],
+        [hyp_tokens],
+        reference_transform=_PRETOKENIZED,
+        hypothesis_transform=_PRETOKENIZED
+    )
+    matches = ref_tokens == hyp_tokens
 
     return {
         "english_transcription": english_text,
@@ -1,10 +1,15 @@
 import asyncio
-import json
+import orjson
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
 router = APIRouter()
-event_queue = asyncio.Queue()
+
+# One queue per connected /events client; every event is fanned out to all of them
+subscribers: set[asyncio.Queue] = set()
+
+# How many events a client may fall behind before it is disconnected
+SUBSCRIBER_QUEUE_SIZE = 256
 
 @router.get("/events")
 async def sse(request: Request):
@@ -12,16 +17,33 @@ async def sse(request: Request):
     SSE endpoint that streams out events as they happen.
     """
     async def event_generator():
-        while True:
-            if await request.is_disconnected():
-                break
-            event = await event_queue.get()
-            yield f"data: {json.dumps(event)}\n\n"
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscribers.add(queue)
+        try:
+            while True:
+                if await request.is_disconnected():
+                    break
+                event = await queue.get()
+                if event is None:
+                    # Dropped by send_event for falling behind
+                    break
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        finally:
+            subscribers.discard(queue)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 async def send_event(event_type: str, data: dict):
     """
-    Helper to enqueue a dictionary as an SSE event.
+    Helper to push a dictionary as an SSE event to every connected client.
+    Never blocks: clients whose queue is full are disconnected instead.
     """
-    await event_queue.put({"type": event_type, "data": data}) 
\ No newline at end of file
+    event = {"type": event_type, "data": data}
+    for queue in list(subscribers):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
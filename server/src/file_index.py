@@ -0,0 +1,88 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+
+class FileIndex:
+    """
+    In-memory index of the wav files under static/combined, static/arabic and static/english.
+    The index is rebuilt lazily when the mtime of any indexed directory changes.
+    Updates build new containers and swap them in under a lock, so readers on other
+    threads never see a half-built index.
+    """
+
+    def __init__(self, static_dir: str = "static"):
+        self.combined_root = os.path.join(static_dir, "combined")
+        self.arabic_root = os.path.join(static_dir, "arabic")
+        self.english_root = os.path.join(static_dir, "english")
+        self.combined: Dict[str, str] = {}  # item_id -> path relative to combined_root
+        self.arabic: Set[str] = set()  # paths relative to arabic_root
+        self.english: Set[str] = set()  # paths relative to english_root
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self.version = 0  # Bumped whenever the indexed files change
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def _stat_mtime(self, directory: str) -> Optional[int]:
+        try:
+            return os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _scan(self, directory: str, mtimes: Dict[str, Optional[int]]):
+        """Yield the paths of all wav files under directory, recording directory mtimes"""
+        mtimes[directory] = self._stat_mtime(directory)
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir():
+                yield from self._scan(entry.path, mtimes)
+            elif entry.name.endswith('.wav'):
+                yield entry.path
+
+    def refresh(self):
+        """Rebuild the index from disk"""
+        with self._lock:
+            mtimes = {}
+            combined = {}
+            for path in self._scan(self.combined_root, mtimes):
+                item_id = os.path.basename(path)[:-len('.wav')]
+                combined.setdefault(item_id, path[len(self.combined_root) + 1:])
+            arabic = {path[len(self.arabic_root) + 1:] for path in self._scan(self.arabic_root, mtimes)}
+            english = {path[len(self.english_root) + 1:] for path in self._scan(self.english_root, mtimes)}
+            self.combined, self.arabic, self.english = combined, arabic, english
+            self._mtimes = mtimes
+            self.version += 1
+
+    def find(self, item_id: str) -> Optional[Path]:
+        """Get the combined wav for an item, or None if there is none"""
+        rel_path = self.combined.get(item_id)
+        return Path(self.combined_root, rel_path) if rel_path is not None else None
+
+    def refresh_if_stale(self):
+        """Rebuild the index if any indexed directory changed since the last scan"""
+        if any(self._stat_mtime(d) != mtime for d, mtime in list(self._mtimes.items())):
+            self.refresh()
+
+    def add_split(self, rel_path: str):
+        """
+        Record a freshly written arabic/english pair (rel_path relative to each root)
+        without rescanning.
+        """
+        with self._lock:
+            mtimes = dict(self._mtimes)
+            for root in (self.arabic_root, self.english_root):
+                directory = os.path.dirname(os.path.join(root, rel_path))
+                while True:
+                    mtimes[directory] = self._stat_mtime(directory)
+                    if directory == root:
+                        break
+                    directory = os.path.dirname(directory)
+            self.arabic = self.arabic | {rel_path}
+            self.english = self.english | {rel_path}
+            self._mtimes = mtimes
+            self.version += 1
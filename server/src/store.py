@@ -0,0 +1,97 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+import orjson
+from pydantic import BaseModel
+
+class Item(BaseModel):
+    wer: float
+    forced_approved: bool
+    matches: bool
+    english_transcription: str
+
+class ItemStore:
+    """
+    Items are kept in memory and persisted as a snapshot (items.json) plus an
+    append-only log of changes (items.jsonl). Each set/delete appends one line;
+    the log is folded back into the snapshot once it outgrows it.
+    Changes are serialized by a lock since set() is called from worker threads
+    as well as the event loop.
+    """
+    def __init__(self, storage_file: str = "items.json", min_compact_entries: int = 100):
+        self.storage_file = Path(storage_file)
+        self.log_file = self.storage_file.with_suffix(".jsonl")
+        self.min_compact_entries = min_compact_entries
+        self.items: Dict[str, Item] = self._load()
+        self._log_entries = 0
+        self.version = 0  # Bumped on every change
+        self._lock = threading.Lock()
+        if self.log_file.exists():
+            # Fold whatever the last run logged into the snapshot
+            self._save()
+
+    def _load(self) -> Dict[str, Item]:
+        """Load items from disk: the snapshot, then the changes logged since"""
+        items = {}
+        if self.storage_file.exists():
+            data = orjson.loads(self.storage_file.read_bytes())
+            items = {k: Item(**v) for k, v in data.items()}
+        if self.log_file.exists():
+            with open(self.log_file, "rb") as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        break  # Torn final write
+                    if entry["item"] is None:
+                        items.pop(entry["id"], None)
+                    else:
+                        items[entry["id"]] = Item(**entry["item"])
+        return items
+
+    def _save(self):
+        """Write a full snapshot to disk and truncate the log"""
+        tmp_file = self.storage_file.with_suffix(".json.tmp")
+        tmp_file.write_bytes(
+            orjson.dumps({k: v.dict() for k, v in self.items.items()}, option=orjson.OPT_INDENT_2)
+        )
+        os.replace(tmp_file, self.storage_file)
+        self.log_file.unlink(missing_ok=True)
+        self._log_entries = 0
+
+    def _append(self, item_id: str, item: Optional[Item]):
+        """Log a single change, compacting once the log is larger than the store"""
+        with open(self.log_file, "ab") as f:
+            f.write(orjson.dumps({"id": item_id, "item": item.dict() if item else None}) + b"\n")
+        self._log_entries += 1
+        if self._log_entries > max(len(self.items), self.min_compact_entries):
+            self._save()
+
+    def get(self, item_id: str) -> Optional[Item]:
+        """Get an item by ID"""
+        return self.items.get(item_id)
+
+    def set(self, item_id: str, item: Item):
+        """Set an item by ID"""
+        with self._lock:
+            self.items[item_id] = item
+            self.version += 1
+            self._append(item_id, item)
+
+    def delete(self, item_id: str) -> bool:
+        """Delete an item by ID. Returns True if item existed"""
+        with self._lock:
+            if item_id in self.items:
+                del self.items[item_id]
+                self.version += 1
+                self._append(item_id, None)
+                return True
+            return False
+
+    def list_all(self) -> Dict[str, Item]:
+        """Get all items"""
+        return self.items
+
+# Initialize the store
+item_store = ItemStore()